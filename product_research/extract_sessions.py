@@ -4,19 +4,34 @@ Extract metrics from Claude Code session transcripts.
 
 Usage:
     python extract_sessions.py > sessions.jsonl
+    python extract_sessions.py --with-file-lists > sessions.jsonl
     python extract_sessions.py --summary
 """
 
-import json
+import heapq
+import mmap
+import multiprocessing
 import os
 import sys
 from pathlib import Path
 from datetime import datetime
 from collections import defaultdict
 from typing import Optional
-import re
+
+try:
+    import orjson as _json
+    # Match stdlib json, which writes non-str keys (e.g. a null tool name) as strings
+    DUMPS_KWARGS = {"option": _json.OPT_NON_STR_KEYS}
+except ImportError:
+    import json as _json
+    DUMPS_KWARGS = {}
 
 CLAUDE_DIR = Path.home() / ".claude" / "projects"
+ERROR_MARKERS = ("error", "failed", "exception", "not found")
+CACHE_DIR = Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache")
+# Bump the version when extract_session's output changes
+CACHE_FILE = CACHE_DIR / "ai-session-tracker" / "extract-v1.jsonl"
+SUMMARY_FIELDS = ("project", "duration_minutes", "total_tool_calls", "tool_counts", "errors")
 
 
 def parse_timestamp(ts: str) -> Optional[datetime]:
@@ -29,28 +44,69 @@ def parse_timestamp(ts: str) -> Optional[datetime]:
         return None
 
 
-def extract_session(jsonl_path: Path) -> dict:
-    """Extract metrics from a single session JSONL file."""
-    messages = []
-    with open(jsonl_path, "r") as f:
-        for line in f:
-            try:
-                messages.append(json.loads(line))
-            except json.JSONDecodeError:
-                continue
+def has_error_marker(text: str) -> bool:
+    """Case-insensitive substring check for common error words."""
+    low = text.lower()
+    return any(marker in low for marker in ERROR_MARKERS)
+
+
+def dumps(obj) -> str:
+    """Serialize to a JSON string (orjson returns bytes)."""
+    out = _json.dumps(obj, **DUMPS_KWARGS)
+    return out.decode() if isinstance(out, bytes) else out
 
-    if not messages:
-        return None
+
+def fadvise(f, advice: str):
+    """Pass an access-pattern hint to the kernel where supported (not macOS)."""
+    try:
+        os.posix_fadvise(f.fileno(), 0, 0, getattr(os, advice))
+    except (AttributeError, OSError):
+        pass
+
+
+def iter_messages(jsonl_path: Path):
+    """Yield parsed messages from a JSONL file, skipping malformed lines.
+
+    The file is memory-mapped and split on newlines with mmap.find, which
+    avoids the buffered reader's per-line overhead.
+    """
+    with open(jsonl_path, "rb") as f:
+        if not os.fstat(f.fileno()).st_size:
+            return  # mmap rejects empty files
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            size = len(mm)
+            if hasattr(mmap, "MADV_SEQUENTIAL"):
+                mm.madvise(mmap.MADV_SEQUENTIAL)
+            start = 0
+            while start < size:
+                end = mm.find(b"\n", start)
+                if end == -1:
+                    end = size
+                try:
+                    yield _json.loads(mm[start:end])
+                except (_json.JSONDecodeError, UnicodeDecodeError):
+                    pass
+                start = end + 1
+        # Each transcript is read once; let the kernel drop its pages
+        fadvise(f, "POSIX_FADV_DONTNEED")
+
+
+def extract_session(jsonl_path: Path, with_file_lists: bool = False) -> dict:
+    """Extract metrics from a single session JSONL file.
+
+    File paths are only listed (sorted) when with_file_lists is set;
+    otherwise just the read/edited counts are reported.
+    """
+    message_count = 0
 
     # Basic info
     session_id = None
     project = None
     git_branch = None
-    timestamps = []
+    ts_min = ts_max = None
 
     # Tool usage
-    tool_counts = defaultdict(int)
-    tool_errors = defaultdict(int)
+    tool_counts = {}
     error_samples = []
 
     # Message counts
@@ -59,13 +115,22 @@ def extract_session(jsonl_path: Path) -> dict:
     system_messages = 0
 
     # Files
-    files_read = set()
-    files_edited = set()
+    # Appended per tool call and deduplicated once after the loop
+    files_read = []
+    files_edited = []
 
     # Subagents
     subagent_count = 0
 
-    for msg in messages:
+    # This loop stays plain Python on purpose: it walks heterogeneous JSON
+    # (dict/list/str unions) that Numba cannot compile, and what's left to
+    # reduce numerically (a string min/max and a few dict increments) is too
+    # small to pay for building NumPy arrays per session. A compiled
+    # (Cython/yyjson) tokenizer isn't worth a build step for a research
+    # script either; the native parser lives in the Rust CLI (src/parser.rs).
+    # Messages are consumed as they are parsed; none are kept after use.
+    for msg in iter_messages(jsonl_path):
+        message_count += 1
         msg_type = msg.get("type")
 
         # Extract session info
@@ -75,65 +140,93 @@ def extract_session(jsonl_path: Path) -> dict:
             project = msg["cwd"]
         if not git_branch and msg.get("gitBranch"):
             git_branch = msg["gitBranch"]
-        if msg.get("timestamp"):
-            ts = parse_timestamp(msg["timestamp"])
-            if ts:
-                timestamps.append(ts)
-
-        # Count message types
-        if msg_type == "user":
-            user_messages += 1
-
-            # Check for tool results (including errors)
-            content = msg.get("message", {}).get("content", [])
-            if isinstance(content, list):
-                for item in content:
-                    if isinstance(item, dict) and item.get("type") == "tool_result":
-                        is_error = item.get("is_error", False)
-                        result_content = item.get("content", "")
-                        if is_error or (isinstance(result_content, str) and
-                                        re.search(r"error|failed|exception|not found",
-                                                  result_content, re.I)):
-                            error_samples.append(result_content[:200] if isinstance(result_content, str) else str(result_content)[:200])
-
-        elif msg_type == "assistant":
+        # Transcript timestamps are fixed-width UTC ISO strings, so they order
+        # correctly as plain strings; only the two endpoints get parsed.
+        # Anything not shaped like YYYY-MM-DDTHH:MM:SS is skipped, as an
+        # unparseable timestamp was before. A "+00:00" suffix is folded to
+        # "Z"; fractional seconds of differing widths are not normalized and
+        # would misorder, but Claude Code always writes milliseconds.
+        ts = msg.get("timestamp")
+        if type(ts) is str and len(ts) >= 19 and ts[4] == "-" and ts[10] == "T":
+            if ts.endswith("+00:00"):
+                ts = ts[:-6] + "Z"
+            if ts_min is None or ts < ts_min:
+                ts_min = ts
+            if ts_max is None or ts > ts_max:
+                ts_max = ts
+
+        # Count message types. Parsed JSON only yields exact builtin types,
+        # so `type(x) is list` is safe and cheaper than isinstance.
+        # Assistant messages are the most common, so test them first.
+        if msg_type == "assistant":
             assistant_messages += 1
 
             # Extract tool calls
-            content = msg.get("message", {}).get("content", [])
-            if isinstance(content, list):
+            content = msg.get("message")
+            content = content.get("content") if type(content) is dict else None
+            if type(content) is list:
                 for item in content:
-                    if isinstance(item, dict) and item.get("type") == "tool_use":
+                    if type(item) is dict and item.get("type") == "tool_use":
                         tool_name = item.get("name", "unknown")
-                        tool_counts[tool_name] += 1
+                        tool_counts[tool_name] = tool_counts.get(tool_name, 0) + 1
 
                         # Extract file paths from tool inputs
                         tool_input = item.get("input", {})
-                        if isinstance(tool_input, dict):
+                        if type(tool_input) is dict:
                             file_path = tool_input.get("file_path") or tool_input.get("path")
                             if file_path:
                                 if tool_name == "Read":
-                                    files_read.add(file_path)
+                                    files_read.append(file_path)
                                 elif tool_name in ("Edit", "Write"):
-                                    files_edited.add(file_path)
+                                    files_edited.append(file_path)
+
+        elif msg_type == "user":
+            user_messages += 1
+
+            # Check for tool results (including errors)
+            content = msg.get("message")
+            content = content.get("content") if type(content) is dict else None
+            if type(content) is list:
+                for item in content:
+                    if type(item) is dict and item.get("type") == "tool_result":
+                        is_error = item.get("is_error", False)
+                        result_content = item.get("content", "")
+                        if is_error or (type(result_content) is str and
+                                        has_error_marker(result_content)):
+                            error_samples.append(result_content[:200] if type(result_content) is str else str(result_content)[:200])
 
         elif msg_type == "system":
             system_messages += 1
 
+    if not message_count:
+        return None
+
+    files_read = set(files_read)
+    files_edited = set(files_edited)
+
     # Count subagents
     subagent_dir = jsonl_path.parent / "subagents"
     if subagent_dir.exists():
         subagent_count = len(list(subagent_dir.glob("*.jsonl")))
 
+    files = {
+        "read": len(files_read),
+        "edited": len(files_edited),
+    }
+    if with_file_lists:
+        files["read_list"] = sorted(files_read)[:20]  # First 20
+        files["edited_list"] = sorted(files_edited)
+
     # Calculate duration
     duration_minutes = None
     start_time = None
     end_time = None
-    if timestamps:
-        timestamps.sort()
-        start_time = timestamps[0].isoformat()
-        end_time = timestamps[-1].isoformat()
-        duration_minutes = (timestamps[-1] - timestamps[0]).total_seconds() / 60
+    start = parse_timestamp(ts_min)
+    end = parse_timestamp(ts_max)
+    if start and end:
+        start_time = start.isoformat()
+        end_time = end.isoformat()
+        duration_minutes = (end - start).total_seconds() / 60
 
     return {
         "session_id": session_id,
@@ -143,7 +236,7 @@ def extract_session(jsonl_path: Path) -> dict:
         "start_time": start_time,
         "end_time": end_time,
         "duration_minutes": round(duration_minutes, 1) if duration_minutes else None,
-        "tool_counts": dict(tool_counts),
+        "tool_counts": tool_counts,
         "total_tool_calls": sum(tool_counts.values()),
         "errors": {
             "count": len(error_samples),
@@ -155,16 +248,105 @@ def extract_session(jsonl_path: Path) -> dict:
             "system": system_messages,
             "total": user_messages + assistant_messages + system_messages
         },
-        "files": {
-            "read": len(files_read),
-            "edited": len(files_edited),
-            "read_list": sorted(files_read)[:20],  # First 20
-            "edited_list": sorted(files_edited)
-        },
+        "files": files,
         "subagent_count": subagent_count
     }
 
 
+def cache_key(path: Path, with_file_lists: bool) -> tuple:
+    """Key a session file on path, mtime and size so edits invalidate it."""
+    st = path.stat()
+    return (str(path), st.st_mtime_ns, st.st_size, with_file_lists)
+
+
+def extract_keyed(key: tuple) -> tuple:
+    """Pool worker: extract the session file named in a cache key."""
+    return key, extract_session(Path(key[0]), with_file_lists=key[3])
+
+
+def load_cache():
+    """Index the cache file without loading any results.
+
+    Returns the open cache file (or None) and a dict mapping each cache_key
+    to the (offset, length) of its entry line. Entries are read back one at
+    a time with read_cache_line, so a warm run never holds every cached
+    session in memory.
+    """
+    index = {}
+    try:
+        f = open(CACHE_FILE, "rb")
+    except OSError:
+        return None, index
+    offset = 0
+    for line in f:
+        try:
+            index[tuple(_json.loads(line)["key"])] = (offset, len(line))
+        except (_json.JSONDecodeError, UnicodeDecodeError, KeyError, TypeError):
+            pass
+        offset += len(line)
+    return f, index
+
+
+def read_cache_line(f, span: tuple) -> Optional[bytes]:
+    """Read one indexed entry line back from the cache file."""
+    offset, length = span
+    try:
+        f.seek(offset)
+        return f.read(length)
+    except OSError:
+        return None
+
+
+def open_cache():
+    """Open a temp file for this run's cache entries, or None if unwritable."""
+    try:
+        CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        return open(CACHE_FILE.with_suffix(".tmp"), "wb")
+    except OSError as e:
+        print(f"Could not write cache {CACHE_FILE}: {e}", file=sys.stderr)
+        return None
+
+
+def discard_cache(f, error: OSError):
+    """Warn about a cache I/O error and drop this run's partial cache."""
+    print(f"Could not write cache {CACHE_FILE}: {error}", file=sys.stderr)
+    try:
+        f.close()
+        os.remove(f.name)
+    except OSError:
+        pass
+
+
+def cache_line(key: tuple, result) -> bytes:
+    """Encode one extract_session result as a cache entry line."""
+    return (dumps({"key": key, "result": result}) + "\n").encode()
+
+
+def write_cache_line(f, line: bytes):
+    """Append an entry line to an open cache file.
+
+    Returns the file, or None once a write has failed and the cache is
+    disabled for the rest of the run.
+    """
+    if f:
+        try:
+            f.write(line)
+        except OSError as e:
+            discard_cache(f, e)
+            return None
+    return f
+
+
+def close_cache(f):
+    """Replace the cache with the entries written this run."""
+    if f:
+        try:
+            f.close()
+            os.replace(f.name, CACHE_FILE)
+        except OSError as e:
+            discard_cache(f, e)
+
+
 def find_sessions():
     """Find all session JSONL files."""
     if not CLAUDE_DIR.exists():
@@ -172,27 +354,42 @@ def find_sessions():
         return []
 
     sessions = []
-    for jsonl in CLAUDE_DIR.rglob("*.jsonl"):
+    for dirpath, dirnames, filenames in os.walk(CLAUDE_DIR, followlinks=True):
         # Skip subagent files for main session list
-        if "subagents" in str(jsonl):
-            continue
-        sessions.append(jsonl)
+        if "subagents" in dirnames:
+            dirnames.remove("subagents")
+        for name in filenames:
+            if name.endswith(".jsonl"):
+                sessions.append(Path(dirpath, name))
 
     return sessions
 
 
 def print_summary(sessions):
     """Print summary statistics."""
-    total_duration = sum(s.get("duration_minutes") or 0 for s in sessions)
-    total_tools = sum(s.get("total_tool_calls") or 0 for s in sessions)
-    total_errors = sum(s.get("errors", {}).get("count", 0) for s in sessions)
-
-    # Aggregate tool counts
+    home = str(Path.home())
+    total_duration = 0
+    total_tools = 0
+    total_errors = 0
     all_tools = defaultdict(int)
+    by_project = defaultdict(lambda: [0, 0])  # [sessions, minutes]
+
+    # Aggregate everything in a single pass over the sessions
     for s in sessions:
+        duration = s.get("duration_minutes") or 0
+        total_duration += duration
+        total_tools += s.get("total_tool_calls") or 0
+        total_errors += s.get("errors", {}).get("count", 0)
+
         for tool, count in s.get("tool_counts", {}).items():
             all_tools[tool] += count
 
+        proj = s.get("project", "unknown")
+        # Shorten project path
+        proj = proj.replace(home, "~") if proj else "unknown"
+        by_project[proj][0] += 1
+        by_project[proj][1] += duration
+
     print("=" * 60)
     print("CLAUDE CODE SESSION ANALYSIS")
     print("=" * 60)
@@ -206,29 +403,19 @@ def print_summary(sessions):
         print(f"  {tool}: {count}")
 
     print("\n--- Sessions by Project ---")
-    by_project = defaultdict(list)
-    for s in sessions:
-        proj = s.get("project", "unknown")
-        # Shorten project path
-        proj = proj.replace(str(Path.home()), "~") if proj else "unknown"
-        by_project[proj].append(s)
-
-    for proj, proj_sessions in sorted(by_project.items(), key=lambda x: -len(x[1])):
-        total_time = sum(s.get("duration_minutes") or 0 for s in proj_sessions)
-        print(f"  {proj}: {len(proj_sessions)} sessions, {total_time:.0f} min")
+    for proj, (count, total_time) in sorted(by_project.items(), key=lambda x: -x[1][0]):
+        print(f"  {proj}: {count} sessions, {total_time:.0f} min")
 
     print("\n--- Longest Sessions ---")
-    by_duration = sorted(sessions, key=lambda x: x.get("duration_minutes") or 0, reverse=True)
-    for s in by_duration[:5]:
-        proj = (s.get("project") or "").replace(str(Path.home()), "~")
+    for s in heapq.nlargest(5, sessions, key=lambda x: x.get("duration_minutes") or 0):
+        proj = (s.get("project") or "").replace(home, "~")
         print(f"  {s.get('duration_minutes', 0):.0f} min - {proj}")
 
     print("\n--- Sessions with Most Errors ---")
-    by_errors = sorted(sessions, key=lambda x: x.get("errors", {}).get("count", 0), reverse=True)
-    for s in by_errors[:5]:
+    for s in heapq.nlargest(5, sessions, key=lambda x: x.get("errors", {}).get("count", 0)):
         if s.get("errors", {}).get("count", 0) == 0:
             break
-        proj = (s.get("project") or "").replace(str(Path.home()), "~")
+        proj = (s.get("project") or "").replace(home, "~")
         print(f"  {s.get('errors', {}).get('count', 0)} errors - {proj}")
         for sample in s.get("errors", {}).get("samples", [])[:2]:
             print(f"    → {sample[:80]}...")
@@ -238,18 +425,56 @@ def main():
     sessions_paths = find_sessions()
     print(f"Found {len(sessions_paths)} session files", file=sys.stderr)
 
+    summary = "--summary" in sys.argv
+    with_file_lists = "--with-file-lists" in sys.argv
     sessions = []
-    for path in sessions_paths:
-        result = extract_session(path)
-        if result:
-            sessions.append(result)
 
-    if "--summary" in sys.argv:
+    def emit(result):
+        if not result:
+            return
+        if summary:
+            # Keep only what print_summary reads; file lists can be large
+            sessions.append({k: result[k] for k in SUMMARY_FIELDS})
+        else:
+            # Output as JSONL, streaming results as workers finish
+            sys.stdout.write(dumps(result) + "\n")
+
+    # Cached results are read one line at a time and every entry is written
+    # out as it is emitted, so results don't accumulate in memory. The
+    # rewrite also drops files that no longer exist.
+    cache_in, cache = load_cache()
+    cache_out = open_cache()
+    pending = []
+    for path in sessions_paths:
+        key = cache_key(path, with_file_lists)
+        line = read_cache_line(cache_in, cache.pop(key)) if key in cache else None
+        if line:
+            cache_out = write_cache_line(cache_out, line)
+            emit(_json.loads(line)["result"])
+        else:
+            pending.append(key)
+        # Keep the other --with-file-lists variant while the file is unchanged
+        other = key[:3] + (not with_file_lists,)
+        if other in cache:
+            line = read_cache_line(cache_in, cache.pop(other))
+            if line:
+                cache_out = write_cache_line(cache_out, line)
+    cache.clear()
+    if cache_in:
+        cache_in.close()
+    print(f"Reusing {len(sessions_paths) - len(pending)} cached, extracting {len(pending)}",
+          file=sys.stderr)
+
+    if pending:
+        with multiprocessing.Pool(os.cpu_count()) as pool:
+            for key, result in pool.imap_unordered(extract_keyed, pending, chunksize=8):
+                cache_out = write_cache_line(cache_out, cache_line(key, result))
+                emit(result)
+
+    close_cache(cache_out)
+
+    if summary:
         print_summary(sessions)
-    else:
-        # Output as JSONL
-        for s in sessions:
-            print(json.dumps(s))
 
 
 if __name__ == "__main__":